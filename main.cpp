@@ -14,6 +14,7 @@ void stopSystem();
 void homeServo();
 void runContinuousSorting();
 void sendStatus();
+void sendWeight();
 int classifyEgg(); // Returns index (0=BAD, 1=SMALL, 2=MEDIUM, 3=LARGE)
 void calibrateUno();
 void calibrateHX711(float known_weight = 23.0f);
@@ -149,7 +150,7 @@ void setup() {
     delay(1000);
 
     Serial.println(F("System Ready!"));
-    Serial.println(F("Commands: START [ranges], STOP, HOME, STATUS, SET_RANGES <s_min> <s_max> <m_min> <m_max> <l_min> <l_max>"));
+    Serial.println(F("Commands: START [ranges], STOP, HOME, STATUS, READ_WEIGHT, SET_RANGES <s_min> <s_max> <m_min> <m_max> <l_min> <l_max>"));
     Serial.println(F("Calibration: CALIBRATE_UNO, CALIBRATE_HX711 [weight], CALIBRATE_NEMA23, CALIBRATE_LOADER, CALIBRATE_MG996R"));
 }
 
@@ -252,6 +253,7 @@ void handleSerialCommands() {
 
                 else if (strcmp(p, "HOME") == 0) homeServo();
                 else if (strcmp(p, "STATUS") == 0) sendStatus();
+                else if (strcmp(p, "READ_WEIGHT") == 0) sendWeight();
                 
                 // NEW: Handle QUALITY command from frontend
                 else if (strncmp(p, "QUALITY", 7) == 0) {
@@ -631,6 +633,7 @@ void calibrateUno() {
     }
     calibrationMode = false;
     Serial.println(F("CALIBRATION_COMPLETE:UNO"));
+    Serial.println(F("CALIBRATION_END"));
 }
 
 void calibrateHX711(float known_weight) {
@@ -638,6 +641,7 @@ void calibrateHX711(float known_weight) {
     if (!hx711.is_ready()) {
         Serial.println(F("{\"hx711\":\"error\",\"message\":\"HX711 not ready\"}"));
         calibrationMode = false;
+        Serial.println(F("CALIBRATION_END"));
         return;
     }
 
@@ -728,6 +732,7 @@ void calibrateHX711(float known_weight) {
     Serial.println();
     
     calibrationMode = false;
+    Serial.println(F("CALIBRATION_END"));
 }
 
 void calibrateNema23() {
@@ -759,6 +764,7 @@ void calibrateNema23() {
     digitalWrite(NEMA23_ENABLE_PIN, HIGH);
     calibrationMode = false;
     Serial.println(F("CALIBRATION_COMPLETE:NEMA23"));
+    Serial.println(F("CALIBRATION_END"));
 }
 
 /**
@@ -804,6 +810,7 @@ void calibrateLoaderServo() {
 
     calibrationMode = false;
     Serial.println(F("CALIBRATION_COMPLETE:LOADER"));
+    Serial.println(F("CALIBRATION_END"));
 }
 
 void calibrateMG996R() {
@@ -822,6 +829,7 @@ void calibrateMG996R() {
     delay(1000);
     calibrationMode = false;
     Serial.println(F("CALIBRATION_COMPLETE:MG996R"));
+    Serial.println(F("CALIBRATION_END"));
 }
 
 // ==================== TRAPEZOIDAL SPEED PROFILE ====================
@@ -895,4 +903,18 @@ void sendStatus() {
     Serial.print(F("MEDIUM: ")); Serial.print(mediumMin, 1); Serial.print(F("g - ")); Serial.print(mediumMax, 1); Serial.println(F("g"));
     Serial.print(F("LARGE: ")); Serial.print(largeMin, 1); Serial.print(F("g - ")); Serial.print(largeMax, 1); Serial.println(F("g"));
     Serial.println(F("==================="));
+    Serial.println(F("STATUS_END")); // Explicit end-of-response sentinel for the host
+}
+
+// Single-line weight reply for fast polling (avoids the full STATUS dump)
+void sendWeight() {
+    if (!hx711_calibrated) {
+        Serial.println(F("HX711 Calibrated: NO"));
+    } else if (hx711.is_ready()) {
+        Serial.print(F("HX711 Reading: "));
+        Serial.print(hx711.get_units(10));
+        Serial.println(F(" g"));
+    } else {
+        Serial.println(F("HX711 Reading: ERROR (Not Ready)"));
+    }
 }
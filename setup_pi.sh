@@ -13,7 +13,7 @@ sudo apt install python3 python3-pip python3-venv git -y
 
 # Install Python packages
 echo "📚 Installing Python packages..."
-pip3 install websockets pyserial python-dotenv
+pip3 install -r "$(dirname "$0")/requirements.txt"
 
 # Create systemd service
 echo "⚙️ Creating systemd service..."
@@ -26,7 +26,7 @@ After=network.target
 Type=simple
 User=pi
 WorkingDirectory=/home/pi/MEGG-FINAL/iot-backend
-ExecStart=/usr/bin/python3 websocket_server.py
+ExecStart=/usr/bin/python3 simple_iot_server.py
 Restart=always
 RestartSec=10
 Environment=PYTHONPATH=/home/pi/MEGG-FINAL/iot-backend
@@ -42,7 +42,7 @@ sudo systemctl enable megg-iot-backend.service
 
 # Set permissions
 echo "🔐 Setting permissions..."
-sudo chmod +x /home/pi/MEGG-FINAL/iot-backend/websocket_server.py
+sudo chmod +x /home/pi/MEGG-FINAL/iot-backend/simple_iot_server.py
 
 echo "✅ Setup complete!"
 echo "🔧 To start the service: sudo systemctl start megg-iot-backend"
@@ -9,24 +9,282 @@ Connects to Arduino and handles calibration commands
 
 import asyncio
 import websockets
+# The asyncio implementation (websockets >= 17): select_subprotocol(connection, ...),
+# send(bytes, text=True) and broadcast(..., text=True) all rely on it
+from websockets.asyncio.server import ServerConnection, broadcast, serve
 import serial
+import serial_asyncio
 import json
+import logging
+import logging.handlers
 import os
 import platform
-from datetime import datetime
+import queue
+import re
+import signal
+import socket
+import sys
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
 from dotenv import load_dotenv
 from modules.calibration import CalibrationRouter
 
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used as a fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: the megg-msgpack-v1 subprotocol is offered only when installed
+    msgpack = None
+
 # Load environment variables
 load_dotenv()
 
+# Per-message and per-serial-line traces; debug level, shown with LOG_LEVEL=DEBUG.
+# main() routes them through a queue so stdout is written off the event loop.
+log = logging.getLogger("megg")
+
+# JSON codec: _dumps returns UTF-8 bytes (sent as text frames); orjson when installed.
+# Both serialize the event dataclasses below as plain objects.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the latter.
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, default=asdict).encode()
+    _loads = json.loads
+
+# Wire form of the fixed commands sent most often; anything else is encoded per call
+_COMMAND_BYTES = {
+    "STATUS": b"STATUS\n",
+    "STOP": b"STOP\n",
+    "READ_WEIGHT": b"READ_WEIGHT\n",
+}
+
+
+def _encode_command(command: str) -> bytes:
+    return _COMMAND_BYTES.get(command) or f"{command}\n".encode()
+
+
+def _build_start_commands(configurations) -> dict[str, str]:
+    """START/START_PLAIN command lines carrying the configured egg size ranges."""
+    commands = {"START": "START", "START_PLAIN": "START_PLAIN"}
+    try:
+        ranges = configurations.get('eggSizeRanges') or configurations.get('egg_ranges')
+        if ranges:
+            s_min = float(ranges['small']['min'])
+            s_max = float(ranges['small']['max'])
+            m_min = float(ranges['medium']['min'])
+            m_max = float(ranges['medium']['max'])
+            l_min = float(ranges['large']['min'])
+            l_max = float(ranges['large']['max'])
+            args = f"{s_min} {s_max} {m_min} {m_max} {l_min} {l_max}"
+            commands = {name: f"{name} {args}" for name in commands}
+    except Exception as e:
+        # If parsing fails, fall back to plain START/START_PLAIN
+        print(f"⚠️ Failed to build ranges for START: {e}. Falling back to 'START'.")
+    return commands
+
+
+def _system_status(connected: bool, components: bool) -> dict:
+    status = {
+        "type": "system_status",
+        "server": {"status": "running"},
+        "arduino": {"connected": connected},
+    }
+    if components:
+        status["components"] = {
+            "UNO": {"status": "unknown"},
+            "HX711": {"status": "unknown"},
+            "NEMA23": {"status": "unknown"},
+            "SG90": {"status": "unknown"},
+            "LOADER": {"status": "unknown"},
+            "MG996R": {"status": "unknown"}
+        }
+    return status
+
+
+# system_status only varies with the Arduino connection, so every variant is encoded
+# once: (with component list, connected) -> (JSON, msgpack or None)
+_STATUS_FRAMES = {
+    (components, connected): (
+        _dumps(_system_status(connected, components)),
+        msgpack.packb(_system_status(connected, components)) if msgpack is not None else None,
+    )
+    for components in (False, True)
+    for connected in (False, True)
+}
+
+
+# "HX711 Reading: 23.45 g" (emitted by both STATUS and READ_WEIGHT)
+_WEIGHT_RE = re.compile(r"HX711 Reading:\s*(-?\d+(?:\.\d+)?)\s*g")
+
+# Telemetry lines the read loop reacts to, matched in one pass and dispatched on match.lastgroup:
+#   r  - "HX711 Reading: 23.45 g"
+#   w  - "HX711: Weight measured: 47.12 g"
+#   sz - "SORT: Egg (47.12g) classified as MEDIUM" (labels may carry a suffix, e.g. "BAD (GAP)")
+_LINE_RE = re.compile(
+    r"^(?:HX711 Reading:\s*(?P<r>-?\d+(?:\.\d+)?)\s*g"
+    r"|HX711: Weight measured: (?P<w>-?\d+(?:\.\d+)?) g"
+    r"|SORT: Egg \((?P<sw>-?\d+(?:\.\d+)?)g\) classified as (?P<sz>\S.*))"
+)
+
+# Components accepted by calibration_request
+CALIBRATION_COMPONENTS = frozenset({"UNO", "HX711", "NEMA23", "SG90", "LOADER", "MG996R"})
+
+# Clients offering this subprotocol receive broadcasts as zlib-compressed binary frames
+ZBIN_SUBPROTOCOL = "megg-zbin"
+# Payloads smaller than this are not worth compressing and go out as plain JSON text
+ZBIN_MIN_SIZE = 200
+
+# Clients offering this subprotocol (when msgpack is installed) send binary msgpack
+# frames and get their replies as msgpack; broadcasts stay JSON
+MSGPACK_SUBPROTOCOL = "megg-msgpack-v1"
+# Integer "type" tags accepted in place of the type name; append only, never reorder
+MSGPACK_TYPE_TAGS = (
+    "get_status",
+    "get_weight",
+    "start_sorting",
+    "stop_sorting",
+    "start_plain_sorting",
+    "calibration_request",
+    "set_configuration",
+    "send_command",
+)
+
+# High-frequency events are coalesced into one "batch" frame per interval (or per max items)
+BATCH_INTERVAL = 0.05
+BATCH_MAX_ITEMS = 140
+
+# USB (VID, PID) pairs of supported boards: Arduino Uno R3, Arduino Nano Every,
+# CH340-based clones, Arduino.org Uno
+ARDUINO_USB_IDS = frozenset({
+    (0x2341, 0x0043),
+    (0x2341, 0x0058),
+    (0x1A86, 0x7523),
+    (0x2A03, 0x0043),
+})
+# Opening the port resets the board; wait this long before talking to it. Set
+# ARDUINO_RESET_DELAY=0 for boards without auto-reset or for a simulated serial port.
+ARDUINO_RESET_DELAY = float(os.getenv("ARDUINO_RESET_DELAY", "2.0"))
+# Remembers the last port an Arduino answered on so the next start probes it first
+LAST_PORT_FILE = os.path.expanduser("~/.megg_last_port")
+
+# Read-loop events waiting for delivery; the oldest is dropped when full
+BROADCAST_QUEUE_SIZE = 1000
+
+# Weight readings younger than this are served from memory instead of the serial port
+WEIGHT_CACHE_TTL = 0.05
+
+def _parse_weight_line(line: str):
+    """on_line parser for weight reads: grams, False if the HX711 is uncalibrated, else None."""
+    if line == "HX711 Calibrated: NO":
+        return False
+    match = _WEIGHT_RE.match(line)
+    return float(match.group(1)) if match else None
+
+
+# Second-resolution prefix of the last timestamp produced by iso_now()
+_iso_cache = (0, "")
+
+
+def iso_now() -> str:
+    """Local-time ISO 8601 timestamp with microseconds (like datetime.now().isoformat()).
+
+    The date/time prefix only changes once per second, so it is formatted
+    once and reused; each call just appends the fractional part.
+    """
+    global _iso_cache
+    now = time.time()
+    sec = int(now)
+    if sec != _iso_cache[0]:
+        _iso_cache = (sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec)))
+    return f"{_iso_cache[1]}.{int((now - sec) * 1e6):06d}"
+
+
+@dataclass
+class ClientState:
+    """Per-connection state kept alongside each WebSocket client."""
+    zbin: bool = False  # negotiated the megg-zbin subprotocol
+    msgpack: bool = False  # negotiated the megg-msgpack-v1 subprotocol
+
+
+# Events streamed once per Arduino line; slotted dataclasses are lighter than dicts
+@dataclass(slots=True)
+class SortingProgress:
+    type: str = field(default="sorting_progress", init=False)
+    message: str
+    timestamp: str
+
+
+@dataclass(slots=True)
+class EggProcessed:
+    type: str = field(default="egg_processed", init=False)
+    weight: float | None
+    size: str
+    accountId: str | None
+    batchId: str | None
+    timestamp: str
+
+
+@dataclass(slots=True)
+class CalibrationProgress:
+    type: str = field(default="calibration_progress", init=False)
+    component: str
+    message: str
+    timestamp: str
+
+
 class MEGGIoTServer:
     def __init__(self):
+        # Underlying serial.Serial (used as the "connected" flag) and its asyncio stream pair
         self.arduino = None
-        self.connected_clients = set()
-        self.calibration_router: CalibrationRouter | None = None
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        # (weight_g, monotonic timestamp) of the last HX711 reading seen on the serial line
+        self._last_weight: tuple[float, float] | None = None
+        self.connected_clients: dict[ServerConnection, ClientState] = {}
+        # Session configuration from the last set_configuration message
+        self.current_configuration: dict | None = None
+        # Per-session IDs stamped on every egg_processed event, resolved once in set_configuration
+        self._cached_account_id: str | None = None
+        self._cached_batch_id = None
+        # START/START_PLAIN command lines for the current ranges, built in set_configuration
+        self._start_commands: dict[str, str] = {}
+        self.calibration_router = CalibrationRouter(self.send_arduino_command)
         self.serial_lock: asyncio.Lock | None = asyncio.Lock()
         self.serial_write_lock: asyncio.Lock | None = asyncio.Lock()
+        # Pre-encoded events waiting for the next batch frame (see queue_broadcast)
+        self._pending: list[bytes] = []
+        self._flush_event = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+        # Events produced by the serial read loop, delivered by _broadcast_worker
+        self._broadcast_q: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+        self._bcast_task: asyncio.Task | None = None
+        # Set by shutdown() (or SIGINT/SIGTERM) to let start_server return
+        self._stop_event = asyncio.Event()
+
+        # Map client message "type" to handler
+        self._handlers = {
+            "calibration_request": self._h_calibrate,
+            "get_status": self._h_status,
+            "get_weight": self._h_weight,
+            "set_configuration": self._h_set_configuration,
+            "send_command": self._h_send_command,
+            "start_sorting": self._h_start_sorting,
+            "start_plain_sorting": self._h_start_plain_sorting,
+            "stop_sorting": self._h_stop_sorting,
+        }
+        # Structured payloads may name the action in "command" instead of "type"
+        self._command_handlers = {
+            "start_sorting": self._h_start_sorting,
+            "start_plain_sorting": self._h_start_plain_sorting,
+            "stop_sorting": self._h_stop_sorting,
+        }
         
         # Auto-detect ports based on operating system
         if platform.system() == "Windows":
@@ -40,182 +298,253 @@ class MEGGIoTServer:
             ]
         
     def list_available_ports(self):
-        """List all available serial ports"""
+        """List available serial ports as (device, vid, pid); vid/pid are None for non-USB ports"""
         import serial.tools.list_ports
-        ports = serial.tools.list_ports.comports()
-        available_ports = []
-        for port in ports:
-            available_ports.append(port.device)
-        return available_ports
+        return [(port.device, port.vid, port.pid) for port in serial.tools.list_ports.comports()]
+
+    def _load_last_port(self):
+        """Return the (device, vid, pid) of the last successful connection, if recorded."""
+        try:
+            with open(LAST_PORT_FILE, "rb") as f:
+                cached = _loads(f.read())
+            return cached["device"], cached.get("vid"), cached.get("pid")
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_last_port(self, port_info):
+        device, vid, pid = port_info
+        try:
+            with open(LAST_PORT_FILE, "wb") as f:
+                f.write(_dumps({"device": device, "vid": vid, "pid": pid}))
+        except OSError as e:
+            print(f"⚠️ Could not record last Arduino port: {e}")
     
+    async def _serial_write(self, data: bytes):
+        """Write to the Arduino, waiting only for transport backpressure."""
+        self.writer.write(data)
+        await self.writer.drain()
+
+    async def _drain_input(self, max_lines: int = 100):
+        """Discard lines already buffered from the Arduino without waiting for new ones."""
+        for _ in range(max_lines):
+            try:
+                await asyncio.wait_for(self.reader.readline(), timeout=0.01)
+            except asyncio.TimeoutError:
+                break
+
+    def _close_serial(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.arduino = None
+        self.reader = None
+        self.writer = None
+
     async def connect_arduino(self):
         """Connect to Arduino on available port"""
         # First, try to find Arduino by listing available ports
         available_ports = self.list_available_ports()
-        print(f"🔍 Available ports: {available_ports}")
+        print(f"🔍 Available ports: {[device for device, _, _ in available_ports]}")
         
-        # Try available ports first, then fallback to common ports (avoid duplicates)
-        ports_to_try = list(dict.fromkeys(available_ports + self.arduino_ports))
+        # Probe order: last known-good port (if the same board is still there), ports whose
+        # USB VID/PID identify an Arduino, then every other available port and the common
+        # fallbacks (avoid duplicates). Each probe costs ~3 s, so known boards go first.
+        last_port = self._load_last_port()
+        ports_to_try = []
+        if last_port in available_ports:
+            ports_to_try.append(last_port[0])
+        ports_to_try += [device for device, vid, pid in available_ports if (vid, pid) in ARDUINO_USB_IDS]
+        ports_to_try += [device for device, _, _ in available_ports] + self.arduino_ports
+        ports_to_try = list(dict.fromkeys(ports_to_try))
         
         for port in ports_to_try:
             try:
                 print(f"🔌 Trying to connect to Arduino on {port}...")
-                self.arduino = serial.Serial(
-                    port=port,
+                self.reader, self.writer = await serial_asyncio.open_serial_connection(
+                    url=port,
                     baudrate=115200,
-                    timeout=1,
-                    write_timeout=1,
                     dsrdtr=False,  # Disable DTR to prevent auto-reset
                     rtscts=False   # Disable RTS/CTS
                 )
-                await asyncio.sleep(2)  # Wait for Arduino to initialize
+                self.arduino = self.writer.transport.serial
+                # Drop the USB-serial latency timer from ~16 ms to ~1 ms where the driver allows it (Linux)
+                try:
+                    self.arduino.set_low_latency_mode(True)
+                except (AttributeError, ValueError, OSError):
+                    pass
+                if ARDUINO_RESET_DELAY > 0:
+                    await asyncio.sleep(ARDUINO_RESET_DELAY)  # Wait for Arduino to initialize
                 
-                # Clear any startup data in buffers
-                self.arduino.reset_input_buffer()
-                self.arduino.reset_output_buffer()
+                # Clear any startup data
+                await self._drain_input()
                 
                 # Test connection
-                self.arduino.write(b"STATUS\n")
-                await asyncio.sleep(1)
+                await self._serial_write(_COMMAND_BYTES["STATUS"])
+                try:
+                    response = await asyncio.wait_for(self.reader.readline(), timeout=1)
+                except asyncio.TimeoutError:
+                    response = b""
                 
-                if self.arduino.in_waiting > 0:
-                    response = self.arduino.readline().decode().strip()
+                if response:
+                    response = response.decode(errors="replace").strip()
                     print(f"✅ Arduino connected on {port}: {response}")
+                    port_info = next((info for info in available_ports if info[0] == port), None)
+                    if port_info is not None:
+                        self._save_last_port(port_info)
                     # Broadcast current status to clients
-                    await self.broadcast_to_clients({
-                        "type": "system_status",
-                        "server": {"status": "running"},
-                        "arduino": {"connected": True},
-                    })
+                    if self.connected_clients:
+                        self._send_to_all(_STATUS_FRAMES[False, True][0])
                     return True
+                self._close_serial()
                     
             except Exception as e:
                 print(f"❌ Failed to connect on {port}: {e}")
-                if self.arduino:
-                    self.arduino.close()
-                    self.arduino = None
+                self._close_serial()
                     
         print("❌ No Arduino found on any port")
         return False
     
-    async def send_arduino_command(self, command):
-        """Send command to Arduino and get response"""
+    async def send_arduino_command(self, command, on_line=None, cached=None):
+        """Send command to Arduino and get response.
+
+        ``on_line`` is called with each response line; the first non-None value it
+        returns ends the read early and is returned as ``parsed``. ``cached`` is
+        called once the port is ours; a non-None value is returned as ``parsed``
+        without sending the command (e.g. a reading the previous holder just got).
+        """
         if not self.arduino:
             return {"success": False, "error": "Arduino not connected"}
         
-        # Serialize access to the serial port to avoid buffer races
+        # Serialize access to the serial port to avoid buffer races; tell clients when
+        # a command has to wait behind another one (e.g. a running calibration)
+        if self.serial_lock.locked() and self.connected_clients:
+            self.enqueue_broadcast({
+                "type": "command_queued",
+                "command": command.strip(),
+                "timestamp": iso_now(),
+            })
         async with self.serial_lock:
+            if cached is not None:
+                parsed = cached()
+                if parsed is not None:
+                    return {"success": True, "response": [], "message": "cached", "parsed": parsed}
             try:
-                # Clear small pending data before sending, but do not aggressively flush during others' reads
-                try:
-                    self.arduino.reset_input_buffer()
-                    self.arduino.reset_output_buffer()
-                except Exception:
-                    pass
-                await asyncio.sleep(0.05)
-
                 # Send command
-                print(f"🔧 Sending command: {command}")
-                self.arduino.write(f"{command}\n".encode())
-                self.arduino.flush()  # Ensure command is sent immediately
-                await asyncio.sleep(0.2)
+                log.debug("🔧 Sending command: %s", command)
+                await self._serial_write(_encode_command(command))
+                # The firmware echoes every command as "CMD: <command>" (truncated to its
+                # 79-char input buffer); anything read before the echo belongs to an
+                # earlier exchange and is skipped instead of flushing the port.
+                echo = f"CMD: {command.strip()[:79]}"
+                synced = False
                 
                 # Read response
                 response_lines = []
-                timeout = 0
                 # Extend timeouts for long-running flows
                 if command.startswith("START"):
-                    max_timeout = 1200  # ~120s for full cycle
+                    timeout = 120.0  # full cycle
                 elif command.strip() == "STOP":
-                    max_timeout = 300   # ~30s to ensure we read STOP_ACK
+                    timeout = 30.0   # ensure we read STOP_ACK
                 elif "CALIBRATE" in command:
-                    # For calibration, keep reading until explicit completion/error markers.
-                    # Use None to indicate no hard timeout, but keep a very high ceiling as a safety valve.
-                    max_timeout = None
-                    safety_timeout = 3600  # ~6 minutes safety cut-off
+                    # For calibration, keep reading until explicit completion/error markers,
+                    # with a very high ceiling as a safety valve.
+                    timeout = 360.0  # 6 minutes safety cut-off
                 else:
-                    max_timeout = 60    # ~6s for other commands
+                    timeout = 6.0    # other commands
+                # Wall-clock deadline, so slow iterations count against the timeout too
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + timeout
 
                 last_weight = None
+                # START and CALIBRATE_ stream every line to clients
+                sorting = command.startswith("START")
+                calibrating = command.startswith("CALIBRATE_")
+                streams = sorting or calibrating
+                # Component name is after CALIBRATE_
+                component = command.split()[0].replace("CALIBRATE_", "") if calibrating else None
                 while True:
-                    if self.arduino.in_waiting > 0:
-                        line = self.arduino.readline().decode().strip()
-                        if line:
-                            response_lines.append(line)
-                            print(f"📨 Arduino: {line}")
-
-                            # Stream sorting progress to clients for visibility during START/START_PLAIN
-                            if command.startswith("START"):
-                                await self.broadcast_to_clients({
-                                    "type": "sorting_progress",
-                                    "message": line,
-                                    "timestamp": datetime.now().isoformat(),
-                                })
-
-                                # Parse measurement and classification to emit egg_processed
-                                try:
-                                    if line.startswith("HX711: Weight measured:"):
-                                        # e.g., "HX711: Weight measured: 47.12 g"
-                                        parts = line.split(":")[-1].strip().split(" ")
-                                        if parts:
-                                            last_weight = float(parts[0])
-                                    elif "classified as" in line and line.startswith("SORT: Egg ("):
-                                        # e.g., "SORT: Egg (47.12g) classified as MEDIUM"
-                                        size = line.split("classified as")[-1].strip()
-                                        payload = {
-                                            "type": "egg_processed",
-                                            "weight": last_weight,
-                                            "size": size,
-                                            "accountId": (self.current_configuration or {}).get("accountId"),
-                                            "batchId": (self.current_configuration or {}).get("batchId") or ((self.current_configuration or {}).get("currentBatch") or {}).get("id"),
-                                            "timestamp": datetime.now().isoformat(),
-                                        }
-                                        await self.broadcast_to_clients(payload)
-                                except Exception as _:
-                                    pass
-
-                            # Stream calibration progress to clients in real-time
-                            if command.startswith("CALIBRATE_"):
-                                # Component name is after CALIBRATE_
-                                comp = command.split()[0].replace("CALIBRATE_", "")
-                                payload = {
-                                    "type": "calibration_progress",
-                                    "component": comp,
+                    try:
+                        raw = await asyncio.wait_for(self.reader.readline(), timeout=deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        if "CALIBRATE" in command:
+                            response_lines.append("CALIBRATION_TIMEOUT_SAFETY")
+                        break
+                    if raw == b"":
+                        raise ConnectionError("Serial connection closed")
+                    # Line noise (e.g. around a board reset) must not abort the whole read
+                    line = raw.decode(errors="replace").strip()
+                    if not synced:
+                        if line != echo:
+                            if line:
+                                log.debug("📨 Arduino (stale): %s", line)
+                            continue
+                        synced = True
+                    # STATUS and calibration responses are framed by explicit end sentinels
+                    if line == "STATUS_END" and command == "STATUS":
+                        break
+                    if line == "CALIBRATION_END" and "CALIBRATE" in command:
+                        break
+                    if line:
+                        response_lines.append(line)
+                        log.debug("📨 Arduino: %s", line)
+
+                        match = _LINE_RE.match(line)
+                        kind = match.lastgroup if match is not None else None
+                        if kind == "r":
+                            self._last_weight = (float(match["r"]), time.monotonic())
+                        elif kind == "w":
+                            # Weight of the egg the next SORT line classifies
+                            last_weight = float(match["w"])
+
+                        # Nothing to build when no UI is listening
+                        if streams and self.connected_clients:
+                            # One timestamp per line, shared by every event it produces
+                            ts = iso_now()
+                            if sorting:
+                                # Stream sorting progress for visibility during START/START_PLAIN
+                                self.queue_broadcast(SortingProgress(line, ts))
+                                if kind == "sz":
+                                    self.queue_broadcast(EggProcessed(
+                                        last_weight,
+                                        match["sz"],
+                                        self._cached_account_id,
+                                        self._cached_batch_id,
+                                        ts,
+                                    ))
+                            else:
+                                # Stream calibration progress to clients in real-time
+                                self.enqueue_broadcast(CalibrationProgress(component, line, ts))
+                        
+                        if on_line is not None:
+                            parsed = on_line(line)
+                            if parsed is not None:
+                                return {
+                                    "success": True,
+                                    "response": response_lines,
                                     "message": line,
-                                    "timestamp": datetime.now().isoformat(),
+                                    "parsed": parsed,
                                 }
-                                await self.broadcast_to_clients(payload)
-                            
-                            # For STATUS command, stop after seeing the closing line
-                            if command == "STATUS" and "===================" in line and len(response_lines) > 5:
-                                break
-                            
-                            # Check for completion
-                            if "CALIBRATION_COMPLETE" in line:
-                                break
-                            if '"hx711":"done"' in line or '"hx711": "done"' in line:
-                                break
-                            if "ERROR" in line:
-                                break
-                            # End markers for long-running flows
-                            if command.strip() == "STOP" and ("STOP_ACK" in line or "SYSTEM_STOPPED" in line):
-                                break
-                            # If we are running a START/START_PLAIN loop, exit promptly when hardware reports stop
-                            if command.startswith("START") and ("STOP_ACK" in line or "SYSTEM_STOPPED" in line):
-                                break
-                    else:
-                        await asyncio.sleep(0.1)
-                        timeout += 1
 
-                        # For calibration: no hard timeout, but respect safety timeout to avoid hanging forever
-                        if "CALIBRATE" in command and timeout > safety_timeout:
-                            response_lines.append("CALIBRATION_TIMEOUT_SAFETY")
+                        # READ_WEIGHT answers with a single HX711 line
+                        if command == "READ_WEIGHT" and line.startswith("HX711 "):
+                            break
+                        
+                        # Check for completion
+                        if "ERROR" in line:
+                            break
+                        # Final lines of firmware that predates STATUS_END/CALIBRATION_END
+                        if command == "STATUS" and line == "===================" and len(response_lines) > 5:
                             break
-                        # For other commands, honor max_timeout
-                        if max_timeout is not None and timeout >= max_timeout:
+                        if "CALIBRATE" in command and (
+                            "CALIBRATION_COMPLETE" in line
+                            or '"hx711":"done"' in line
+                            or '"hx711": "done"' in line
+                        ):
                             break
-                        # For STATUS, if we have data and no more coming, break
-                        if command == "STATUS" and len(response_lines) > 5 and timeout > 5:
+                        # End markers for long-running flows
+                        if command.strip() == "STOP" and ("STOP_ACK" in line or "SYSTEM_STOPPED" in line):
+                            break
+                        # If we are running a START/START_PLAIN loop, exit promptly when hardware reports stop
+                        if command.startswith("START") and ("STOP_ACK" in line or "SYSTEM_STOPPED" in line):
                             break
 
                 return {
@@ -232,17 +561,14 @@ class MEGGIoTServer:
             return {"success": False, "error": "Arduino not connected"}
         async with self.serial_write_lock:
             try:
-                print(f"🔧 Sending command (write-only): {command}")
-                self.arduino.write(f"{command}\n".encode())
-                self.arduino.flush()
-                await asyncio.sleep(0.05)
+                log.debug("🔧 Sending command (write-only): %s", command)
+                await self._serial_write(_encode_command(command))
                 return {"success": True}
             except Exception as e:
                 return {"success": False, "error": str(e)}
     
     async def get_weight_reading(self):
         """Get current weight reading from HX711 sensor"""
-        print("🔍 get_weight_reading() called")
         if not self.arduino:
             print("❌ Arduino not connected")
             return {
@@ -250,59 +576,45 @@ class MEGGIoTServer:
                 "success": False,
                 "error": "Arduino not connected"
             }
-        
+
+        # Serve a fresh reading straight from memory when the serial loop just saw one
+        weight = self._fresh_weight()
+        if weight is not None:
+            return self._weight_payload(weight)
+
         try:
-            # Send STATUS command to get weight reading
-            result = await self.send_arduino_command("STATUS")
-            print(f"🔍 STATUS result: success={result.get('success')}")
-            
+            # READ_WEIGHT returns a single line; older firmware only knows STATUS
+            # Both stop reading as soon as the weight (or "not calibrated") line arrives.
+            # Polls queued behind another READ_WEIGHT re-check the cache once they hold the port
+            result = await self.send_arduino_command(
+                "READ_WEIGHT", on_line=_parse_weight_line, cached=self._fresh_weight
+            )
+            if (result.get("success") and "parsed" not in result
+                    and any("Unknown command" in line for line in result.get("response", []))):
+                result = await self.send_arduino_command(
+                    "STATUS", on_line=_parse_weight_line, cached=self._fresh_weight
+                )
+
             if result.get("success"):
-                response_lines = result.get("response", [])
-                print(f"🔍 Response lines: {response_lines}")
-                
-                # Check if HX711 is calibrated
-                is_calibrated = any("HX711 Calibrated: YES" in line for line in response_lines)
-                print(f"🔍 HX711 calibrated: {is_calibrated}")
-                
-                if not is_calibrated:
+                parsed = result.get("parsed")
+                if parsed is False:
                     return {
                         "type": "weightReading",
                         "success": False,
                         "error": "HX711 not calibrated"
                     }
-                
-                # Parse weight from response
-                for line in response_lines:
-                    if "HX711 Reading:" in line:
-                        print(f"🔍 Found weight line: {line}")
-                        # Extract weight value (format: "HX711 Reading: 23.45 g")
-                        parts = line.split(":")
-                        if len(parts) >= 2:
-                            weight_str = parts[1].strip().replace("g", "").strip()
-                            print(f"🔍 Parsed weight string: '{weight_str}'")
-                            try:
-                                weight = float(weight_str)
-                                print(f"✅ Successfully parsed weight: {weight}")
-                                return {
-                                    "type": "weightReading",
-                                    "success": True,
-                                    "weight": weight,
-                                    "unit": "g",
-                                    "timestamp": datetime.now().isoformat()
-                                }
-                            except ValueError as e:
-                                print(f"❌ ValueError parsing weight: {e}")
-                                pass
-                
+                if parsed is not None:
+                    return self._weight_payload(parsed)
+
                 # If we couldn't parse weight, return error
-                print("❌ Could not parse weight from response")
+                print(f"❌ Could not parse weight from response: {result.get('response', [])}")
                 return {
                     "type": "weightReading",
                     "success": False,
                     "error": "Could not parse weight from Arduino response"
                 }
             else:
-                print(f"❌ STATUS command failed: {result.get('error')}")
+                print(f"❌ Weight command failed: {result.get('error')}")
                 return {
                     "type": "weightReading",
                     "success": False,
@@ -315,12 +627,28 @@ class MEGGIoTServer:
                 "success": False,
                 "error": str(e)
             }
-    
+
+    def _fresh_weight(self):
+        """Last HX711 reading from the serial loop if younger than WEIGHT_CACHE_TTL, else None."""
+        cached = self._last_weight
+        if cached is not None and time.monotonic() - cached[1] < WEIGHT_CACHE_TTL:
+            return cached[0]
+        return None
+
+    def _weight_payload(self, weight):
+        return {
+            "type": "weightReading",
+            "success": True,
+            "weight": weight,
+            "unit": "g",
+            "timestamp": iso_now()
+        }
+
     async def handle_calibration(self, component, weight=None):
         """Handle calibration request via router"""
-        if self.calibration_router is None:
-            self.calibration_router = CalibrationRouter(self.send_arduino_command)
         result = await self.calibration_router.calibrate_component(component, weight)
+        # Let queued calibration_progress events go out before the result
+        await self._broadcast_q.join()
         # Broadcast in standard envelope
         payload = {
             "type": "calibration_result",
@@ -334,30 +662,15 @@ class MEGGIoTServer:
         # Preconditions
         if not self.arduino:
             return {"success": False, "error": "Arduino not connected"}
-        cfg = getattr(self, 'current_configuration', None)
-        if not cfg or not isinstance(cfg, dict) or not cfg.get('configurations'):
+        if self.current_configuration is None:
             return {"success": False, "error": "No configuration provided"}
 
-        # Build START command with ranges if possible
-        cmd = "START"
-        try:
-            ranges = cfg['configurations'].get('eggSizeRanges') or cfg['configurations'].get('egg_ranges')
-            if ranges:
-                s_min = float(ranges['small']['min'])
-                s_max = float(ranges['small']['max'])
-                m_min = float(ranges['medium']['min'])
-                m_max = float(ranges['medium']['max'])
-                l_min = float(ranges['large']['min'])
-                l_max = float(ranges['large']['max'])
-                cmd = f"START {s_min} {s_max} {m_min} {m_max} {l_min} {l_max}"
-        except Exception as e:
-            # If parsing fails, fallback to plain START and proceed
-            print(f"⚠️ Failed to build ranges for START: {e}. Falling back to 'START'.")
+        # START with ranges, prebuilt when the configuration arrived
+        cmd = self._start_commands["START"]
 
         # Send a unique marker to Arduino logs for clarity, then run long-running command in background
         try:
-            self.arduino.write(b"CMD:START_SORTING\n")
-            self.arduino.flush()
+            await self._serial_write(b"CMD:START_SORTING\n")
         except Exception as e:
             print(f"⚠️ Failed to write START marker to Arduino: {e}")
 
@@ -374,27 +687,13 @@ class MEGGIoTServer:
         """Start the physical sorting in weight-only mode by sending START_PLAIN (with ranges if present) in background."""
         if not self.arduino:
             return {"success": False, "error": "Arduino not connected"}
-        cfg = getattr(self, 'current_configuration', None)
-        if not cfg or not isinstance(cfg, dict) or not cfg.get('configurations'):
+        if self.current_configuration is None:
             return {"success": False, "error": "No configuration provided"}
 
-        cmd = "START_PLAIN"
-        try:
-            ranges = cfg['configurations'].get('eggSizeRanges') or cfg['configurations'].get('egg_ranges')
-            if ranges:
-                s_min = float(ranges['small']['min'])
-                s_max = float(ranges['small']['max'])
-                m_min = float(ranges['medium']['min'])
-                m_max = float(ranges['medium']['max'])
-                l_min = float(ranges['large']['min'])
-                l_max = float(ranges['large']['max'])
-                cmd = f"START_PLAIN {s_min} {s_max} {m_min} {m_max} {l_min} {l_max}"
-        except Exception as e:
-            print(f"⚠️ Failed to build ranges for START_PLAIN: {e}. Falling back to 'START_PLAIN'.")
+        cmd = self._start_commands["START_PLAIN"]
 
         try:
-            self.arduino.write(b"CMD:START_PLAIN_SORTING\n")
-            self.arduino.flush()
+            await self._serial_write(b"CMD:START_PLAIN_SORTING\n")
         except Exception as e:
             print(f"⚠️ Failed to write START_PLAIN marker to Arduino: {e}")
 
@@ -413,8 +712,7 @@ class MEGGIoTServer:
 
         # Send a unique marker to Arduino logs for clarity
         try:
-            self.arduino.write(b"CMD:STOP_SORTING\n")
-            self.arduino.flush()
+            await self._serial_write(b"CMD:STOP_SORTING\n")
         except Exception as e:
             print(f"⚠️ Failed to write STOP marker to Arduino: {e}")
 
@@ -430,17 +728,83 @@ class MEGGIoTServer:
     async def broadcast_to_clients(self, message):
         """Send message to all connected WebSocket clients"""
         if self.connected_clients:
-            message_str = json.dumps(message)
-            disconnected = set()
-            
-            for client in self.connected_clients:
+            self._send_to_all(_dumps(message))
+
+    def _send_to_all(self, data: bytes):
+        """Fan out an already-encoded JSON payload to every client.
+
+        Uses websockets.broadcast, which frames the message once and writes it
+        to each open connection without waiting for slow clients; closed
+        connections are skipped (handle_client unregisters them). For clients
+        that negotiated the megg-zbin subprotocol the payload is compressed
+        once and shared across all of them. Replies that must be confirmed
+        (configuration_result, command_result) are still awaited per client.
+        """
+        if len(data) < ZBIN_MIN_SIZE:
+            broadcast(self.connected_clients, data, text=True)
+            return
+
+        plain, zbin = [], []
+        for client, state in self.connected_clients.items():
+            (zbin if state.zbin else plain).append(client)
+        broadcast(plain, data, text=True)
+        if zbin:
+            broadcast(zbin, zlib.compress(data))
+
+    def enqueue_broadcast(self, message):
+        """Hand a message to the broadcast worker without waiting on client sends.
+
+        Keeps the serial read loop from stalling behind slow clients.
+        """
+        try:
+            self._broadcast_q.put_nowait(message)
+        except asyncio.QueueFull:
+            # Drop the oldest event rather than block the reader
+            self._broadcast_q.get_nowait()
+            self._broadcast_q.task_done()
+            self._broadcast_q.put_nowait(message)
+
+    async def _broadcast_worker(self):
+        """Deliver queued read-loop events to clients in order."""
+        while True:
+            message = await self._broadcast_q.get()
+            try:
+                await self.broadcast_to_clients(message)
+            except Exception as e:
+                print(f"⚠️ Broadcast worker error: {e}")
+            finally:
+                self._broadcast_q.task_done()
+
+    def queue_broadcast(self, message):
+        """Queue a high-frequency event for the next coalesced batch frame.
+
+        Clients receive {"type": "batch", "items": [...]} at most every
+        BATCH_INTERVAL seconds, or sooner once BATCH_MAX_ITEMS are pending.
+        """
+        if not self.connected_clients:
+            return
+        self._pending.append(_dumps(message))
+        # Wake the flush loop on the first event of a batch, and again when it is full
+        if len(self._pending) == 1 or len(self._pending) >= BATCH_MAX_ITEMS:
+            self._flush_event.set()
+
+    def _flush_pending(self):
+        items, self._pending = self._pending, []
+        if items and self.connected_clients:
+            self._send_to_all(b'{"type": "batch", "items": [' + b", ".join(items) + b"]}")
+
+    async def _flush_loop(self):
+        """Send queued events as a single batch frame; sleeps while nothing is pending."""
+        while True:
+            await self._flush_event.wait()
+            self._flush_event.clear()
+            if len(self._pending) < BATCH_MAX_ITEMS:
                 try:
-                    await client.send(message_str)
-                except websockets.exceptions.ConnectionClosed:
-                    disconnected.add(client)
-            
-            # Remove disconnected clients
-            self.connected_clients -= disconnected
+                    await asyncio.wait_for(self._flush_event.wait(), timeout=BATCH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_event.clear()
+            self._flush_pending()
 
     async def _execute_long_running_command_and_broadcast_result(self, command: str, result_type: str):
         """Execute a long-running Arduino command and broadcast the final result to all clients."""
@@ -458,176 +822,240 @@ class MEGGIoTServer:
                 "success": False,
                 "error": str(e)
             }
+        # The batch ends with this run; a new one needs a fresh set_configuration.
+        # Cleared only now: STOP lets the current cycle finish, and that egg still belongs to the batch
+        self._cached_batch_id = None
+        # Deliver any queued/batched progress first so the result is the last thing clients see
+        await self._broadcast_q.join()
+        self._flush_pending()
         await self.broadcast_to_clients(payload)
     
     async def handle_client(self, websocket):
         """Handle WebSocket client connection"""
         print(f"🔌 New client connected: {websocket.remote_address}")
-        self.connected_clients.add(websocket)
+        self._tune_socket(websocket)
+        state = ClientState(
+            zbin=websocket.subprotocol == ZBIN_SUBPROTOCOL,
+            msgpack=websocket.subprotocol == MSGPACK_SUBPROTOCOL,
+        )
+        self.connected_clients[websocket] = state
+        # Bound once per connection instead of looked up on every message
+        unpack = msgpack.unpackb if state.msgpack else None
+        handlers = self._handlers
+        command_handlers = self._command_handlers
         # Push an immediate status snapshot to the new client
         try:
-            await websocket.send(json.dumps({
-                "type": "system_status",
-                "server": {"status": "running"},
-                "arduino": {"connected": self.arduino is not None},
-            }))
+            await self._send_status(websocket, components=False)
         except Exception:
             pass
         
         try:
             async for message in websocket:
                 try:
-                    data = json.loads(message)
-                    print(f"📨 Received: {data}")
-                    
-                    if data.get("type") == "calibration_request":
-                        component = data.get("component", "").upper()
-                        weight = data.get("weight")  # Optional weight parameter for HX711
-                        if component in ["UNO", "HX711", "NEMA23", "SG90", "LOADER", "MG996R"]:
-                            await self.handle_calibration(component, weight)
-                        else:
-                            await websocket.send(json.dumps({
-                                "type": "error",
-                                "message": f"Unknown component: {component}"
-                            }))
-                    
-                    elif data.get("type") == "get_status":
-                        status = {
-                            "type": "system_status",
-                            "server": {"status": "running"},
-                            "arduino": {"connected": self.arduino is not None},
-                            "components": {
-                                "UNO": {"status": "unknown"},
-                                "HX711": {"status": "unknown"},
-                                "NEMA23": {"status": "unknown"},
-                                "SG90": {"status": "unknown"},
-                                "LOADER": {"status": "unknown"},
-                                "MG996R": {"status": "unknown"}
-                            }
-                        }
-                        await websocket.send(json.dumps(status))
-                    
-                    elif data.get("type") == "get_weight":
-                        # Get current weight reading from HX711
-                        weight_result = await self.get_weight_reading()
-                        print(f"📤 Sending weight result: {weight_result}")
-                        await websocket.send(json.dumps(weight_result))
-
-                    elif data.get("type") == "set_configuration":
-                        # Accept and store user configuration (egg size ranges, metadata)
-                        cfg = data.get("configurations")
-                        account_id = data.get("accountId") or data.get("account_id")
-                        metadata = data.get("metadata") or {}
-                        uid = data.get("uid")
-                        if not account_id or not cfg:
-                            await websocket.send(json.dumps({
-                                "type": "configuration_result",
-                                "success": False,
-                                "error": "Missing accountId or configurations"
-                            }))
-                        else:
-                            # Store configuration in memory for the session
-                            self.current_configuration = {
-                                "accountId": str(account_id),
-                                "configurations": cfg,
-                                "metadata": metadata,
-                                "uid": uid,
-                                "receivedAt": datetime.now().isoformat()
-                            }
-                            print(f"✅ Configuration stored for {account_id}: {self.current_configuration}")
-                            await websocket.send(json.dumps({
-                                "type": "configuration_result",
-                                "success": True,
-                                "accountId": account_id
-                            }))
-
-                    elif data.get("type") == "send_command":
-                        # Forward a raw command string to Arduino and return response
-                        cmd = str(data.get("command", "")).strip()
-                        if not cmd:
-                            await websocket.send(json.dumps({
-                                "type": "error",
-                                "message": "Missing 'command' field for send_command"
-                            }))
-                        elif not self.arduino:
-                            await websocket.send(json.dumps({
-                                "type": "error",
-                                "message": "Arduino not connected"
-                            }))
-                        else:
-                            # QUALITY commands should not be blocked by long-running START reads
-                            if cmd.startswith("QUALITY "):
-                                result = await self.write_arduino_command_only(cmd)
-                            else:
-                                result = await self.send_arduino_command(cmd)
-                            # Echo back a structured result
-                            await websocket.send(json.dumps({
-                                "type": "command_result",
-                                "command": cmd,
-                                **result
-                            }))
-
-                    elif data.get("type") == "start_sorting":
-                        # Start sorting using current configuration (if available)
-                        res = await self.start_sorting_process()
-                        await websocket.send(json.dumps({
-                            "type": "sorting_result",
-                            **res
-                        }))
-
-                    elif data.get("type") == "start_plain_sorting":
-                        # Start plain (weight-only) sorting
-                        res = await self.start_plain_sorting_process()
-                        await websocket.send(json.dumps({
-                            "type": "plain_sorting_result",
-                            **res
-                        }))
-
-                    elif data.get("type") == "stop_sorting":
-                        # Stop sorting (non-blocking)
-                        res = await self.stop_sorting_process()
-                        await websocket.send(json.dumps({
-                            "type": "sorting_stop_result",
-                            **res
-                        }))
-
-                    elif data.get("command") in ("start_sorting", "stop_sorting"):
+                    if unpack is not None and isinstance(message, bytes):
+                        invalid = "Invalid message"
+                        data = unpack(message)
+                    else:
+                        invalid = "Invalid JSON"
+                        # JSON clients may send binary frames: websockets skips UTF-8
+                        # validation for those and the parser reads the bytes directly
+                        # (malformed UTF-8 then surfaces as a ValueError, answered with "Invalid JSON")
+                        data = _loads(message)
+                    if not isinstance(data, dict):
+                        # Well-formed, but not a message object (e.g. a bare list or number)
+                        invalid = "Invalid message"
+                        raise ValueError("message is not a map")
+                    log.debug("📨 Received: %s", data)
+
+                    message_type = data.get("type")
+                    if state.msgpack and type(message_type) is int and 0 <= message_type < len(MSGPACK_TYPE_TAGS):
+                        # Compact (msgpack) clients may send an integer tag instead of the type name;
+                        # `type(...) is int` keeps booleans from being taken as tags 0/1
+                        message_type = MSGPACK_TYPE_TAGS[message_type]
+                    # Only strings can name a handler; lists/objects are unhashable table keys
+                    handler = handlers.get(message_type) if isinstance(message_type, str) else None
+                    if handler is None:
                         # Support structured client command payloads
-                        cmd = data.get("command")
-                        if cmd == "start_sorting":
-                            res = await self.start_sorting_process()
-                            await websocket.send(json.dumps({
-                                "type": "sorting_result",
-                                **res
-                            }))
-                        elif cmd == "stop_sorting":
-                            res = await self.stop_sorting_process()
-                            await websocket.send(json.dumps({
-                                "type": "sorting_stop_result",
-                                **res
-                            }))
-                    elif data.get("command") == "start_plain_sorting":
-                        res = await self.start_plain_sorting_process()
-                        await websocket.send(json.dumps({
-                            "type": "plain_sorting_result",
-                            **res
-                        }))
+                        command = data.get("command")
+                        if isinstance(command, str):
+                            handler = command_handlers.get(command)
+                    if handler is not None:
+                        await handler(data, websocket)
+                    else:
+                        await self._reply(websocket, {
+                            "type": "error",
+                            "message": f"Unknown message type: {message_type}"
+                        })
                     
-                except json.JSONDecodeError:
-                    await websocket.send(json.dumps({
+                except ValueError:  # json.JSONDecodeError, msgpack's unpack errors, non-map payloads
+                    await self._reply(websocket, {
                         "type": "error",
-                        "message": "Invalid JSON"
-                    }))
+                        "message": invalid
+                    })
                     
         except websockets.exceptions.ConnectionClosed:
             print(f"🔌 Client disconnected: {websocket.remote_address}")
         finally:
-            self.connected_clients.discard(websocket)
+            self.connected_clients.pop(websocket, None)
+
+    async def _h_calibrate(self, data, websocket):
+        component = data.get("component", "").upper()
+        weight = data.get("weight")  # Optional weight parameter for HX711
+        if component in CALIBRATION_COMPONENTS:
+            await self.handle_calibration(component, weight)
+        else:
+            await self._reply(websocket, {
+                "type": "error",
+                "message": f"Unknown component: {component}"
+            })
+
+    async def _h_status(self, data, websocket):
+        await self._send_status(websocket, components=True)
+
+    async def _h_weight(self, data, websocket):
+        # Get current weight reading from HX711
+        weight_result = await self.get_weight_reading()
+        log.debug("📤 Sending weight result: %s", weight_result)
+        await self._reply(websocket, weight_result)
+
+    async def _h_set_configuration(self, data, websocket):
+        # Accept and store user configuration (egg size ranges, metadata)
+        cfg = data.get("configurations")
+        account_id = data.get("accountId") or data.get("account_id")
+        metadata = data.get("metadata") or {}
+        uid = data.get("uid")
+        if not account_id or not cfg:
+            await self._reply(websocket, {
+                "type": "configuration_result",
+                "success": False,
+                "error": "Missing accountId or configurations"
+            })
+        else:
+            # Store configuration in memory for the session
+            self.current_configuration = {
+                "accountId": str(account_id),
+                "configurations": cfg,
+                "metadata": metadata,
+                "uid": uid,
+                "receivedAt": iso_now()
+            }
+            self._cached_account_id = str(account_id)
+            self._cached_batch_id = data.get("batchId") or (data.get("currentBatch") or {}).get("id")
+            self._start_commands = _build_start_commands(cfg)
+            print(f"✅ Configuration stored for {account_id}: {self.current_configuration}")
+            await self._reply(websocket, {
+                "type": "configuration_result",
+                "success": True,
+                "accountId": account_id
+            })
+
+    async def _h_send_command(self, data, websocket):
+        # Forward a raw command string to Arduino and return response
+        cmd = str(data.get("command", "")).strip()
+        if not cmd:
+            await self._reply(websocket, {
+                "type": "error",
+                "message": "Missing 'command' field for send_command"
+            })
+        elif not self.arduino:
+            await self._reply(websocket, {
+                "type": "error",
+                "message": "Arduino not connected"
+            })
+        else:
+            # QUALITY commands should not be blocked by long-running START reads
+            if cmd.startswith("QUALITY "):
+                result = await self.write_arduino_command_only(cmd)
+            else:
+                result = await self.send_arduino_command(cmd)
+            # Echo back a structured result
+            await self._reply(websocket, {
+                "type": "command_result",
+                "command": cmd,
+                **result
+            })
+
+    async def _h_start_sorting(self, data, websocket):
+        # Start sorting using current configuration (if available)
+        res = await self.start_sorting_process()
+        await self._reply(websocket, {
+            "type": "sorting_result",
+            **res
+        })
+
+    async def _h_start_plain_sorting(self, data, websocket):
+        # Start plain (weight-only) sorting
+        res = await self.start_plain_sorting_process()
+        await self._reply(websocket, {
+            "type": "plain_sorting_result",
+            **res
+        })
+
+    async def _h_stop_sorting(self, data, websocket):
+        # Stop sorting (non-blocking)
+        res = await self.stop_sorting_process()
+        await self._reply(websocket, {
+            "type": "sorting_stop_result",
+            **res
+        })
     
+    @staticmethod
+    def _tune_socket(websocket):
+        """Send small frames immediately and let the kernel detect dead peers behind NAT."""
+        sock = websocket.transport.get_extra_info("socket")
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        except OSError as e:
+            print(f"⚠️ Could not set socket options for {websocket.remote_address}: {e}")
+
+    @staticmethod
+    def _select_subprotocol(connection, subprotocols):
+        """Accept the client's first supported subprotocol; plain JSON clients connect without one."""
+        for subprotocol in subprotocols:
+            if subprotocol == ZBIN_SUBPROTOCOL or (subprotocol == MSGPACK_SUBPROTOCOL and msgpack is not None):
+                return subprotocol
+        return None
+
+    async def _reply(self, websocket, message):
+        """Send a reply to one client in the encoding it negotiated.
+
+        Broadcasts are encoded once for everyone and stay JSON (see _send_to_all).
+        """
+        state = self.connected_clients.get(websocket)
+        if state is not None and state.msgpack:
+            await websocket.send(msgpack.packb(message))
+        else:
+            await websocket.send(_dumps(message), text=True)
+
+    async def _send_status(self, websocket, components):
+        """Send a pre-encoded system_status to one client."""
+        json_frame, msgpack_frame = _STATUS_FRAMES[components, self.arduino is not None]
+        state = self.connected_clients.get(websocket)
+        if state is not None and state.msgpack:
+            await websocket.send(msgpack_frame)
+        else:
+            await websocket.send(json_frame, text=True)
+
     async def start_server(self):
         """Start the WebSocket server"""
         print("🚀 Starting MEGG IoT Backend...")
         
+        # Stop cleanly on Ctrl+C and on systemd's SIGTERM (not supported on Windows,
+        # where Ctrl+C still surfaces as KeyboardInterrupt in main)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._on_stop_signal, sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        # Coalesce high-frequency progress events into batch frames
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        self._bcast_task = asyncio.create_task(self._broadcast_worker())
+
         # Try to connect to Arduino
         arduino_connected = await self.connect_arduino()
         if not arduino_connected:
@@ -639,24 +1067,74 @@ class MEGGIoTServer:
         
         print(f"🌐 Starting WebSocket server on {host}:{port}")
         
-        async with websockets.serve(self.handle_client, host, port):
+        # permessage-deflate would recompress every broadcast once per client;
+        # compression is done once per payload in broadcast_to_clients instead.
+        async with serve(
+            self.handle_client,
+            host,
+            port,
+            compression=None,
+            select_subprotocol=self._select_subprotocol,
+        ):
             print(f"✅ MEGG IoT Backend running on ws://{host}:{port}")
             print("🔧 Available commands: calibration_request, get_status, get_weight, set_configuration, send_command, start_sorting, stop_sorting, client_command(start_sorting|stop_sorting)")
             print("📱 Ready for client connections!")
             
-            # Keep server running
-            await asyncio.Future()
+            # Keep server running until shutdown() is called
+            await self._stop_event.wait()
+
+            print("\n🛑 Shutting down MEGG IoT Backend...")
+            # Leaving serve() waits for every connection handler; closing the port ends
+            # any in-flight send_arduino_command (calibration/START) right away
+            self._close_serial()
+
+    def shutdown(self):
+        """Ask start_server to stop serving and release the serial port."""
+        self._stop_event.set()
+
+    def _on_stop_signal(self, sig):
+        # Restore the default handler so a second Ctrl+C/SIGTERM stops the process outright
+        asyncio.get_running_loop().remove_signal_handler(sig)
+        self.shutdown()
+
+def _start_logging():
+    """Send log records through a QueueHandler; a listener thread does the writes."""
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(records, handler)
+    log.addHandler(logging.handlers.QueueHandler(records))
+    log.propagate = False
+    try:
+        log.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    except ValueError:
+        log.setLevel(logging.INFO)
+    listener.start()
+    return listener
+
+def _event_loop_runner():
+    """Prefer uvloop's libuv-based event loop when it is installed (not available on Windows)."""
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            return uvloop.run
+        except ImportError:
+            pass
+    return asyncio.run
 
 def main():
     """Main entry point"""
+    listener = _start_logging()
     server = MEGGIoTServer()
     
     try:
-        asyncio.run(server.start_server())
+        _event_loop_runner()(server.start_server())
     except KeyboardInterrupt:
         print("\n🛑 Shutting down MEGG IoT Backend...")
     except Exception as e:
         print(f"❌ Server error: {e}")
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()
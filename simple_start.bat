@@ -6,7 +6,7 @@ REM Install dependencies if needed
 python -m pip install -r requirements.txt
 
 REM Start the simple IoT backend server
-python simple_main.py
+python simple_iot_server.py
 
 pause
 
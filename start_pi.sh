@@ -56,4 +56,4 @@ echo ""
 echo "Press Ctrl+C to stop the server"
 echo ""
 
-python3 simple_main.py
+python3 simple_iot_server.py
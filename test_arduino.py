@@ -4,58 +4,83 @@
 import serial
 import serial.tools.list_ports
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+def probe_port(port):
+    """Open a port and send STATUS; returns (serial, first response line) or None"""
+    ser = None
+    try:
+        print(f"🔌 Trying port: {port}")
+        ser = serial.Serial(port, 115200, timeout=1)
+        time.sleep(2)  # Give Arduino time to reset
+
+        if not ser.is_open:
+            print(f"❌ Failed to open {port}")
+            ser.close()
+            return None
+
+        print(f"✅ Connected to {port}")
+
+        # Test communication
+        print(f"📤 Sending STATUS command to {port}...")
+        ser.write(b"STATUS\n")
+        time.sleep(0.5)
+
+        response = None
+        if ser.in_waiting > 0:
+            response = ser.readline().decode().strip()
+            print(f"📥 Arduino response on {port}: {response}")
+        return ser, response
+
+    except Exception as e:
+        print(f"❌ Error with {port}: {e}")
+        # Every port is probed at once; don't leave unrelated devices held open
+        if ser is not None:
+            ser.close()
+        return None
 
 def test_arduino_connection():
     """Test connection to Arduino"""
     print("🔍 Testing Arduino connection...")
-    
-    # List available ports
-    ports = [str(p) for p in serial.tools.list_ports.comports()]
-    print(f"📋 Available ports: {ports}")
-    
-    # Try to connect to Arduino
-    for port in ports:
-        try:
-            print(f"🔌 Trying port: {port}")
-            ser = serial.Serial(port, 115200, timeout=1)
-            time.sleep(2)  # Give Arduino time to reset
-            
-            if ser.is_open:
-                print(f"✅ Connected to {port}")
-                
-                # Test communication
-                print("📤 Sending STATUS command...")
-                ser.write(b"STATUS\n")
-                time.sleep(0.5)
-                
-                if ser.in_waiting > 0:
-                    response = ser.readline().decode().strip()
-                    print(f"📥 Arduino response: {response}")
-                    
-                    # Test calibration command
-                    print("📤 Sending CALIBRATE_UNO command...")
-                    ser.write(b"CALIBRATE_UNO\n")
-                    time.sleep(3)  # Wait for calibration to complete
-                    
-                    # Read all available responses
-                    while ser.in_waiting > 0:
-                        response = ser.readline().decode().strip()
-                        if response:
-                            print(f"📥 Arduino: {response}")
-                
-                ser.close()
-                print("✅ Arduino communication test successful!")
-                return True
-            else:
-                print(f"❌ Failed to open {port}")
-                
-        except Exception as e:
-            print(f"❌ Error with {port}: {e}")
-    
-    print("❌ No Arduino found on any port")
-    return False
 
-if __name__ == "__main__":
-    test_arduino_connection()
+    # List available ports (str(p) is "device - description", which Serial() cannot open)
+    port_infos = serial.tools.list_ports.comports()
+    for p in port_infos:
+        print(f"📋 Available port: {p.device} ({p.description})")
+    ports = [p.device for p in port_infos]
 
+    # Probe all ports at once; each probe is dominated by the 2s reset wait
+    if ports:
+        with ThreadPoolExecutor(max_workers=len(ports)) as ex:
+            results = [result for result in ex.map(probe_port, ports) if result]
+    else:
+        results = []
 
+    if not results:
+        print("❌ No Arduino found on any port")
+        return False
+
+    # Prefer a port that answered STATUS; only that one gets the calibration test
+    ser, response = next((result for result in results if result[1]), results[0])
+    for other, _ in results:
+        if other is not ser:
+            other.close()
+
+    if response:
+        # Test calibration command
+        print("📤 Sending CALIBRATE_UNO command...")
+        ser.write(b"CALIBRATE_UNO\n")
+        time.sleep(3)  # Wait for calibration to complete
+
+        # Read all available responses
+        while ser.in_waiting > 0:
+            response = ser.readline().decode().strip()
+            if response:
+                print(f"📥 Arduino: {response}")
+
+    ser.close()
+    print("✅ Arduino communication test successful!")
+    return True
+
+if __name__ == "__main__":
+    test_arduino_connection()